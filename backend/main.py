@@ -1,444 +1,801 @@
-import json
+import asyncio
+import contextlib
+import importlib.util
+import queue
 import random
+import re
+import tempfile
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, ValidationError, field_validator
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 import os
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain.prompts import PromptTemplate
-from langchain.chains import ConversationChain, LLMChain
-from langchain.memory import ConversationBufferMemory
-from langchain.output_parsers import ResponseSchema, StructuredOutputParser
+import httpx
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import orjson
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
 import yaml
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+from prompts import (
+    HISTORY_SUMMARY_PROMPT, MISSING_RATIONALE_PROMPT, PERSONA_SELECTION_PROMPT,
+    PROMPT_1, PROMPT_2, PROMPT_5, PROMPT_6, PROMPT_7, PROMPT_8, PROMPT_9, PROMPT_10, PROMPT_11,
+)
+from semantic_cache import SemanticCache
+
+# Set up logging: handlers only enqueue records, and a listener thread started with the app writes
+# them out, so logging never blocks the event loop on stderr
+log_queue = queue.SimpleQueue()
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+log_listener = QueueListener(log_queue, log_handler)
+queue_handler = QueueHandler(log_queue)
+# The listener's handler adds the level and logger name, so the queued message is left bare
+queue_handler.setFormatter(logging.Formatter("%(message)s"))
+logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
 logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv('keys.env')
 openai_api_key = os.environ['openai_api_key']
 
+# Models used for persona selection and for the improve-question conversation
+SELECTOR_MODEL = 'gpt-4o-mini'
+CONVERSATION_MODEL = 'gpt-4o-mini'
+EMBEDDING_MODEL = 'text-embedding-3-small'
+TEMPERATURE = 0.5
+
+# Similar questions reuse earlier responses: cosine similarity needed for a hit, and entries kept per cache
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.95'))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', '10000'))
+
+# Cap on in-flight OpenAI calls so concurrent pipelines share the event loop without flooding the API.
+# The cap is per worker process, so across the server up to WEB_CONCURRENCY * OPENAI_MAX_CONCURRENT
+# calls can be in flight; size it to the account's rate limit divided by the number of workers.
+OPENAI_SEM = asyncio.Semaphore(int(os.getenv('OPENAI_MAX_CONCURRENT', '8')))
+
+# Rate limits, server errors and dropped connections are retried with jittered exponential backoff, up to this many attempts
+OPENAI_MAX_ATTEMPTS = 6
+# Longest single wait between attempts, whatever a Retry-After header asks for
+OPENAI_MAX_RETRY_WAIT_SECONDS = 60
+
+# Approximate token budget for the conversation history replayed with each improve-question prompt
+HISTORY_TOKEN_BUDGET = int(os.getenv('HISTORY_TOKEN_BUDGET', '4000'))
+
+# Where offline persona-selection batches are tracked, and how often pending batches are polled
+BATCH_RESULTS_DIR = os.getenv('BATCH_RESULTS_DIR', 'batch_results')
+BATCH_POLL_INTERVAL_SECONDS = int(os.getenv('BATCH_POLL_INTERVAL_SECONDS', '60'))
+
 app = FastAPI()
 
-# Configure CORS
+# Configure CORS: only the frontend's origins, and only what its JSON requests need
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["http://localhost:3000"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=os.getenv('CORS_ORIGINS', 'http://localhost:3000').split(','),
+    allow_methods=["GET", "POST"],
+    allow_headers=["Content-Type"],
 )
 
+# Prefer the libyaml C loader when PyYAML was built with it
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+PERSONAS_FILE = 'personas.yaml'
+
 # Global variable to store personas data
 personas_data = {}
+# Modification time of PERSONAS_FILE when it was last loaded
+personas_mtime = None
+# Persona names accepted from the model, rebuilt whenever the personas are loaded
+valid_personas = frozenset()
+
+def default_persona(persona_name):
+    """Return the placeholder definition used for personas missing from the YAML file."""
+    return {
+        "name": persona_name,
+        "role": "Unknown",
+        "background": "No background available"
+    }
+
+def normalize_persona(persona_name, persona):
+    """Return a copy of a persona definition with default values for missing keys."""
+    return {
+        **persona,
+        'original_role': persona_name,
+        'core_expertise': persona.get('core_expertise', []),
+        'cognitive_approach': persona.get('cognitive_approach', ''),
+        'values_and_motivations': persona.get('values_and_motivations', ''),
+        'communication_style': persona.get('communication_style', ''),
+        'notable_trait': persona.get('notable_trait', ''),
+    }
+
+def format_persona_block(persona):
+    """Return the description of a persona used in the improve-question prompt, without its rationale."""
+    return (
+        f"Name: {persona['name']}\n"
+        f"Role: {persona['role']}\n"
+        f"Background: {persona['background']}\n"
+        f"Core Expertise: {', '.join(persona['core_expertise'])}\n"
+        f"Cognitive Approach: {persona['cognitive_approach']}\n"
+        f"Values and Motivations: {persona['values_and_motivations']}\n"
+        f"Communication Style: {persona['communication_style']}\n"
+        f"Notable Trait: {persona['notable_trait']}"
+    )
 
 def load_personas():
-    global personas_data
+    """Load the personas file, returning whether it succeeded.
+
+    A failed reload keeps the last good personas, and the mtime is only recorded after a successful
+    parse, so the file is retried on the next request instead of waiting for another change.
+    """
+    global personas_data, personas_mtime, valid_personas
     try:
-        with open('personas.yaml', 'r', encoding='utf-8') as file:
-            personas_data = yaml.safe_load(file)
-        logger.info(f"Personas loaded successfully. Number of personas: {len(personas_data['personas'])}")
-        logger.info(f"Loaded personas: {list(personas_data['personas'].keys())}")
+        mtime = os.path.getmtime(PERSONAS_FILE)
+        with open(PERSONAS_FILE, 'r', encoding='utf-8') as file:
+            data = yaml.load(file, Loader=YamlLoader)
+        data['personas_normalized'] = {
+            name: normalize_persona(name, persona)
+            for name, persona in data['personas'].items()
+        }
+        # Prompt blocks are static, so format them once, keyed by the YAML key the client sends back as original_role
+        data['persona_blocks'] = {
+            name: format_persona_block(persona)
+            for name, persona in data['personas_normalized'].items()
+        }
+        # The persona list in the selection prompt is the same for every question
+        data['persona_names_string'] = ", ".join(data['personas'])
     except Exception as e:
-        logger.error(f"Error loading personas: {str(e)}")
-        personas_data = {"personas": {}}
+        logger.error("Error loading personas: %s", e)
+        if not personas_data:
+            personas_data = {"personas": {}, "personas_normalized": {}, "persona_blocks": {}, "persona_names_string": ""}
+            valid_personas = frozenset()
+        return False
+    personas_data, personas_mtime = data, mtime
+    valid_personas = frozenset(personas_data['personas'])
+    logger.info("Personas loaded successfully. Number of personas: %s", len(personas_data['personas']))
+    logger.info("Loaded personas: %s", list(personas_data['personas'].keys()))
+    return True
+
+def reload_personas_if_changed():
+    """Reload the personas file if it was modified since it was last loaded."""
+    try:
+        mtime = os.path.getmtime(PERSONAS_FILE)
+    except OSError:
+        return
+    if mtime != personas_mtime:
+        logger.info("Personas file changed on disk, reloading.")
+        # Cached selections and improvements may come from personas that changed or no longer exist
+        if load_personas():
+            app.state.persona_cache.clear()
+            app.state.improvement_cache.clear()
 
 @app.on_event("startup")
 async def startup_event():
+    log_listener.start()
     load_personas()
+
+    # One OpenAI client on a pooled HTTP client, so connections are kept alive across requests
+    app.state.http_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        http2=importlib.util.find_spec("h2") is not None,
+    )
+    app.state.openai_client = AsyncOpenAI(
+        api_key=openai_api_key, http_client=app.state.http_client, max_retries=0  # retried by openai_request
+    )
+    app.state.batch_pollers = set()
+    app.state.persona_cache = SemanticCache(SEMANTIC_CACHE_MAX_ENTRIES, SEMANTIC_CACHE_THRESHOLD)
+    app.state.improvement_cache = SemanticCache(SEMANTIC_CACHE_MAX_ENTRIES, SEMANTIC_CACHE_THRESHOLD)
     logger.info("Application started, personas loaded.")
 
-def get_all_persona_names():
-    """Return all persona names from the loaded YAML file."""
-    persona_names = list(personas_data['personas'].keys())
-    logger.info(f"Available personas: {persona_names}")
-    return persona_names
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Pending batches are picked up again by GET /select-personas-batch/{batch_id}
+    for poller in list(app.state.batch_pollers):
+        poller.cancel()
+    await app.state.http_client.aclose()
+    log_listener.stop()
 
 def get_persona_definition(persona_name):
-    """Return a specific persona definition from the loaded YAML file."""
-    persona = personas_data['personas'].get(persona_name, {
-        "name": persona_name,
-        "role": "Unknown",
-        "background": "No background available"
-    })
-
-    logger.info(f"Retrieved persona: {persona_name}")
-    logger.info(f"Persona keys: {persona.keys()}")
-    
-    # Add default values for missing keys
-    persona['original_role'] = persona_name
-    persona['core_expertise'] = persona.get('core_expertise', [])
-    persona['cognitive_approach'] = persona.get('cognitive_approach', '')
-    persona['values_and_motivations'] = persona.get('values_and_motivations', '')
-    persona['communication_style'] = persona.get('communication_style', '')
-    persona['notable_trait'] = persona.get('notable_trait', '')
-    
+    """Return a specific persona definition, with defaults filled in at load time."""
+    persona = personas_data['personas_normalized'].get(persona_name)
+    if persona is None:
+        persona = normalize_persona(persona_name, default_persona(persona_name))
     return persona
 
+# Persona fields rendered into a prompt block
+PERSONA_BLOCK_FIELDS = ('name', 'role', 'background', 'core_expertise', 'cognitive_approach',
+                        'values_and_motivations', 'communication_style', 'notable_trait')
+
+def get_persona_block(persona):
+    """Return the prompt block for a persona sent by the client.
+
+    Personas identified by original_role use the block precomputed from the loaded definition, as long as
+    the fields the client sent still match it. Anything else is formatted from the client's fields.
+    """
+    known = personas_data['personas_normalized'].get(persona.original_role)
+    if known is not None and all(getattr(persona, field) == known[field] for field in PERSONA_BLOCK_FIELDS):
+        return personas_data['persona_blocks'][persona.original_role]
+    return format_persona_block(persona.model_dump())
+
 def validate_persona_selection(selected_personas):
-    valid_personas = get_all_persona_names()
     validated_personas = []
     for persona in selected_personas:
         if persona in valid_personas:
             validated_personas.append(persona)
         else:
-            logger.warning(f"Invalid persona selected: {persona}. Selecting a random valid persona instead.")
-            validated_personas.append(random.choice(valid_personas))
+            logger.warning("Invalid persona selected: %s. Selecting a random valid persona instead.", persona)
+            validated_personas.append(random.choice(list(personas_data['personas'])))
     return validated_personas
 
 class Question(BaseModel):
     text: str
 
-def get_content(response):
-    if isinstance(response, str):
-        return response
-    elif isinstance(response, dict) and "response" in response:
-        return response["response"]
-    elif isinstance(response, dict) and "output" in response:
-        return response["output"]
-    else:
-        return str(response)
-
-# Select Personas
-@app.post("/select-personas")
-async def select_personas(question: Question):
-    try:
-        logger.info(f"Selecting personas for question: {question.text}")
-        
-        available_personas = get_all_persona_names()
-        logger.info(f"All available personas for selection: {available_personas}")
-
-        chat = ChatOpenAI(temperature=0.5, openai_api_key=openai_api_key)
-
-        response_schemas = [
-            ResponseSchema(name="persona1", description="the most relevant persona selected to use to reason through the question"),
-            ResponseSchema(name="persona2", description="the second most relevant persona selected to use to reason through the question"),
-            ResponseSchema(name="persona3", description="the third most relevant persona selected to use to reason through the question"),
-            ResponseSchema(name="rationale", description="a dictionary where keys are the selected persona names and values are the rationales for selecting each persona")
-        ]
-        output_parser = StructuredOutputParser.from_response_schemas(response_schemas)
-        format_instructions = output_parser.get_format_instructions()
-        format_instructions += "\nEnsure that the 'rationale' field is a dictionary with keys for each selected persona and corresponding rationale values." 
+class PersonaIn(BaseModel):
+    name: str
+    role: str
+    background: str
+    core_expertise: list[str]
+    cognitive_approach: str
+    values_and_motivations: str
+    communication_style: str
+    notable_trait: str
+    rationale: str
+    # YAML key of the persona, as returned by /select-personas
+    original_role: str | None = None
+
+class ImproveRequest(BaseModel):
+    text: str
+    personas: list[PersonaIn]
+
+class QuestionBatch(BaseModel):
+    # The Batch API accepts at most 50,000 requests per input file
+    questions: list[str] = Field(min_length=1, max_length=50_000)
+
+def string_rationales(rationales):
+    """Return the persona -> rationale entries of a model response whose values are strings, dropping the rest."""
+    if not isinstance(rationales, dict):
+        logger.error("Rationale is not a dictionary: %s", rationales)
+        return {}
+    return {persona: rationale for persona, rationale in rationales.items() if isinstance(rationale, str)}
+
+class PersonaSelection(BaseModel):
+    persona1: str
+    persona2: str
+    persona3: str
+    rationale: dict[str, str] = Field(default_factory=dict)
+
+    @field_validator('rationale', mode='before')
+    @classmethod
+    def drop_invalid_rationales(cls, rationale):
+        # Personas left without a usable rationale are filled in by the backfill call
+        return string_rationales(rationale)
+
+def estimate_tokens(messages):
+    """Cheaply estimate the token count of a message history at about four characters per token."""
+    return sum(len(message['content']) for message in messages) // 4
+
+openai_backoff = wait_random_exponential(multiplier=1, max=OPENAI_MAX_RETRY_WAIT_SECONDS)
+
+def retry_after_seconds(response):
+    """Return the delay a response asks for in its retry-after-ms or Retry-After header, or None."""
+    for header, scale in (("retry-after-ms", 1000), ("retry-after", 1)):
+        try:
+            return float(response.headers[header]) / scale
+        except (KeyError, ValueError):
+            continue
+    return None
+
+def wait_for_openai_retry(retry_state):
+    """Wait as long as the failed response asks, up to a cap, else back off exponentially."""
+    response = getattr(retry_state.outcome.exception(), "response", None)
+    delay = retry_after_seconds(response) if response is not None else None
+    if delay is None:
+        return openai_backoff(retry_state)
+    return min(max(delay, 0), OPENAI_MAX_RETRY_WAIT_SECONDS)
+
+def is_retryable_openai_error(error):
+    """Return whether an OpenAI error is transient: a dropped connection, timeout, rate limit or server error."""
+    if isinstance(error, APIConnectionError):
+        return True
+    return isinstance(error, APIStatusError) and (error.status_code in (408, 409, 429) or error.status_code >= 500)
+
+openai_retry = retry(
+    retry=retry_if_exception(is_retryable_openai_error),
+    wait=wait_for_openai_retry,
+    stop=stop_after_attempt(OPENAI_MAX_ATTEMPTS),
+    reraise=True,
+)
 
-        persona_selection_prompt = PromptTemplate(
-            input_variables=["question", "personas"],
-            template="""
-            Consider the following question with careful attention to its nuances and underlying themes.
+@openai_retry
+async def openai_request(call, *args, **kwargs):
+    """Await an OpenAI client call under the concurrency cap, retrying transient errors.
 
-            Question: {question}
+    The cap is released while waiting to retry, so a rate-limited call doesn't hold up the others.
+    """
+    async with OPENAI_SEM:
+        return await call(*args, **kwargs)
 
-            Carefully select 3 expert personas from the following list. Envision how their expertise can intertwine, forming a rich tapestry
-            of interconnected knowledge and perspectives. Consider the depth and breadth each brings,
-            and how their unique insights, when combined, could lead to groundbreaking explorations of the question.
+@openai_retry
+async def open_openai_stream(**kwargs):
+    """Open a streamed chat completion, taking a slot under the concurrency cap and retrying transient errors.
 
-            Available Personas: {personas}
+    On success the slot stays taken; the caller releases OPENAI_SEM once it has finished reading the stream.
+    """
+    await OPENAI_SEM.acquire()
+    try:
+        return await app.state.openai_client.chat.completions.create(stream=True, **kwargs)
+    except BaseException:
+        OPENAI_SEM.release()
+        raise
+
+@contextlib.asynccontextmanager
+async def openai_stream(**kwargs):
+    """Stream a chat completion that counts against the concurrency cap until it has been read or abandoned.
+
+    Only opening the stream is retried, since a stream that fails partway has already yielded output.
+    """
+    stream = await open_openai_stream(**kwargs)
+    try:
+        yield stream
+    finally:
+        OPENAI_SEM.release()
+        await stream.close()
+
+async def complete(messages, model=CONVERSATION_MODEL, **kwargs):
+    """Return the content of a chat completion for messages."""
+    response = await openai_request(
+        app.state.openai_client.chat.completions.create,
+        model=model, messages=messages, temperature=TEMPERATURE, **kwargs
+    )
+    return response.choices[0].message.content or ""
+
+async def trim_history(messages, prompt=""):
+    """Summarize the middle of a history that would go over budget once prompt is sent with it.
+
+    The opening prompt and the latest exchange are kept. Nothing is trimmed when the middle is already just
+    a summary, or when the kept messages and prompt alone exceed the budget, since another summary
+    round-trip couldn't bring the request under it.
+    """
+    prompt_tokens = len(prompt) // 4
+    if len(messages) <= 3 or estimate_tokens(messages) + prompt_tokens <= HISTORY_TOKEN_BUDGET:
+        return
+    head, middle, tail = messages[:1], messages[1:-2], messages[-2:]
+    # The only system message in a history is an earlier summary
+    if len(middle) == 1 and middle[0]['role'] == 'system':
+        return
+    if estimate_tokens(head + tail) + prompt_tokens >= HISTORY_TOKEN_BUDGET:
+        return
+    summary_request = middle + [{"role": "user", "content": HISTORY_SUMMARY_PROMPT}]
+    summary = await complete(summary_request)
+    logger.debug("Trimmed conversation history from ~%d tokens", estimate_tokens(messages))
+    messages[:] = head + [{"role": "system", "content": f"Summary so far: {summary}"}] + tail
+
+async def ask(messages, prompt):
+    """Send the next prompt of a conversation and record both turns in its message history."""
+    await trim_history(messages, prompt)
+    messages.append({"role": "user", "content": prompt})
+    answer = await complete(messages)
+    messages.append({"role": "assistant", "content": answer})
+    return answer
+
+async def embed(text):
+    """Return the embedding of a piece of text."""
+    response = await openai_request(app.state.openai_client.embeddings.create, model=EMBEDDING_MODEL, input=text)
+    return response.data[0].embedding
+
+async def embed_for_cache(question):
+    """Return a question's embedding for the semantic caches, or None if it can't be computed.
+
+    The caches are best-effort, so a failed embedding only means a cache miss.
+    """
+    try:
+        return await embed(question)
+    except Exception as e:
+        logger.warning("Skipping semantic cache, embedding failed: %s", e)
+        return None
+
+async def lookup_cached(cache, question, tag=""):
+    """Look up a question in a semantic cache, returning (payload or None, question embedding or None).
+
+    Exact matches of the normalized question are answered without computing an embedding.
+    """
+    payload = cache.get_exact(question, tag)
+    if payload is not None:
+        return payload, None
+    embedding = await embed_for_cache(question)
+    if embedding is None:
+        return None, None
+    return cache.get_similar(embedding, tag), embedding
+
+def sse_event(payload):
+    """Format a payload as a Server-Sent Events message."""
+    return f"data: {orjson.dumps(payload).decode()}\n\n"
+
+async def ask_streaming(messages, prompt, key):
+    """Like ask, but yield the answer as SSE delta events for key while it is generated."""
+    await trim_history(messages, prompt)
+    messages.append({"role": "user", "content": prompt})
+    chunks = []
+    async with openai_stream(model=CONVERSATION_MODEL, messages=messages, temperature=TEMPERATURE) as stream:
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                chunks.append(delta)
+                yield sse_event({"key": key, "delta": delta})
+    messages.append({"role": "assistant", "content": "".join(chunks)})
+
+async def merge_streams(*streams):
+    """Yield items from several async generators as soon as any of them produces one."""
+    events = asyncio.Queue()
+    finished = object()
+
+    async def drain(stream):
+        try:
+            async for item in stream:
+                await events.put(item)
+            await events.put(finished)
+        except Exception as e:
+            await events.put(e)
 
-            IMPORTANT: 
-            1. Only select personas from the provided list. Do not invent or suggest new personas.
-            2. You MUST provide a clear and specific rationale for EACH of the three selected personas.
-            3. Your response MUST include a 'rationale' field that is a dictionary, where each key is a selected persona's name and the value is the rationale for selecting that persona.
-            4. Failure to provide a rationale for each selected persona will result in an error and require reprocessing.
+    tasks = [asyncio.create_task(drain(stream)) for stream in streams]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            item = await events.get()
+            if item is finished:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def build_persona_selection_prompt(question_text):
+    """Render the persona selection prompt for a question against all loaded personas."""
+    personas_string = personas_data['persona_names_string']
+    logger.debug("All available personas for selection: %s", personas_string)
+    return PERSONA_SELECTION_PROMPT.format(question=question_text, personas=personas_string)
+
+def build_persona_result(selected_persona_definitions, rationales):
+    """Build the /select-personas response body from the chosen persona definitions and their rationales."""
+    return {
+        "personas": [
+            {
+                "original_role": persona['original_role'],
+                "name": persona.get('name', 'Unknown'),
+                "role": persona.get('role', 'Unknown'),
+                "background": persona.get('background', 'No background available'),
+                "core_expertise": persona.get('core_expertise', []),
+                "cognitive_approach": persona.get('cognitive_approach', ''),
+                "values_and_motivations": persona.get('values_and_motivations', ''),
+                "communication_style": persona.get('communication_style', ''),
+                "notable_trait": persona.get('notable_trait', ''),
+                "rationale": rationales.get(persona['original_role'], "Error: No rationale provided")
+            }
+            for persona in selected_persona_definitions
+        ]
+    }
 
+# Select Personas
+@app.post("/select-personas")
+async def select_personas(question: Question):
+    try:
+        logger.info("Selecting personas for question: %s", question.text)
+        reload_personas_if_changed()
 
-            {format_instructions}
-            """,
-            partial_variables={"format_instructions": format_instructions}
-        )
+        cached = app.state.persona_cache.get_exact(question.text)
+        if cached is not None:
+            logger.info("Returning cached persona selection")
+            return cached
+        
+        prompt_content = build_persona_selection_prompt(question.text)
+        logger.debug("Persona selection prompt content:\n%s", prompt_content)
 
-        personas_string = ", ".join(available_personas)
-        prompt_content = persona_selection_prompt.format(question=question.text, personas=personas_string)
-        logger.info("Persona selection prompt content:")
-        logger.info(prompt_content)
+        # Compute the embedding for the similarity lookup while the selection call is already under way,
+        # and abandon the call if a similar question turns out to be cached
+        selection_call = asyncio.create_task(complete([{"role": "user", "content": prompt_content}],
+                                                      model=SELECTOR_MODEL, response_format={"type": "json_object"}))
+        embedding = await embed_for_cache(question.text)
+        cached = app.state.persona_cache.get_similar(embedding) if embedding is not None else None
+        if cached is not None:
+            selection_call.cancel()
+            logger.info("Returning cached persona selection")
+            return cached
 
-        chain = LLMChain(llm=chat, prompt=persona_selection_prompt)
-        response = chain.run(question=question.text, personas=personas_string)
+        response = await selection_call
 
-        logger.info(f"OpenAI API response: {response}")
+        logger.debug("OpenAI API response: %s", response)
 
         try:
-            selection = output_parser.parse(response)
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON parsing error: {e}")
-            logger.error(f"Problematic JSON: {response}")
+            selection = PersonaSelection.model_validate_json(response)
+        except ValidationError as e:
+            logger.error("Persona selection validation error: %s", e)
+            logger.error("Problematic JSON: %s", response)
             raise HTTPException(status_code=500, detail="Error parsing OpenAI response")
 
-        logger.info(f"Parsed selection: {json.dumps(selection, indent=2)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Parsed selection: %s", orjson.dumps(selection.model_dump(), option=orjson.OPT_INDENT_2).decode())
 
-        selected_personas = [selection['persona1'], selection['persona2'], selection['persona3']]
+        selected_personas = [selection.persona1, selection.persona2, selection.persona3]
         validated_personas = validate_persona_selection(selected_personas)
-        logger.info(f"Validated selected personas: {validated_personas}")
-
-        selected_persona_definitions = [get_persona_definition(persona) for persona in validated_personas]
-        logger.info(f"Selected persona definitions: {selected_persona_definitions}")
+        logger.info("Validated selected personas: %s", validated_personas)
 
-        rationales = selection.get('rationale', {})
-        if not isinstance(rationales, dict):
-            logger.error(f"Rationale is not a dictionary: {rationales}")
-            rationales = {}
+        rationales = selection.rationale
 
         missing_rationales = [p for p in validated_personas if p not in rationales]
-        
+
+        # Start the backfill for missing rationales right away so its round-trip overlaps
+        # with building the persona definitions
+        backfill = None
         if missing_rationales:
-            logger.warning(f"Missing rationales for: {missing_rationales}")
+            logger.warning("Missing rationales for: %s", missing_rationales)
             
             # Make another API call to get missing rationales
-            missing_rationale_prompt = PromptTemplate(
-                input_variables=["question", "personas"],
-                template="""
-                For the following question: {question}
-                
-                Provide a clear and specific rationale for selecting each of these personas:
-                {personas}
-                
-                Your response must be a dictionary where each key is a persona name and the value is the rationale.
-                """
-            )
-            
-            missing_rationale_chain = LLMChain(llm=chat, prompt=missing_rationale_prompt)
-            missing_rationale_response = missing_rationale_chain.run(question=question.text, personas=", ".join(missing_rationales))
-            
+            backfill = asyncio.create_task(complete(
+                [{"role": "user", "content": MISSING_RATIONALE_PROMPT.format(
+                    question=question.text, personas=", ".join(missing_rationales))}],
+                model=SELECTOR_MODEL, response_format={"type": "json_object"}))
+
+        selected_persona_definitions = [get_persona_definition(persona) for persona in validated_personas]
+        logger.debug("Selected persona definitions: %s", selected_persona_definitions)
+
+        if backfill is not None:
+            missing_rationale_response = await backfill
             try:
-                additional_rationales = json.loads(missing_rationale_response)
-                rationales.update(additional_rationales)
-            except json.JSONDecodeError:
-                logger.error(f"Error parsing additional rationales: {missing_rationale_response}")
+                additional_rationales = orjson.loads(missing_rationale_response)
+                # Only string rationales fit PersonaIn, which the client sends back to /improve-question
+                rationales.update(string_rationales(additional_rationales))
+            except orjson.JSONDecodeError:
+                logger.error("Error parsing additional rationales: %s", missing_rationale_response)
                 raise HTTPException(status_code=500, detail="Error generating complete rationales")
 
-        logger.info(f"Final rationales: {json.dumps(rationales, indent=2)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Final rationales: %s", orjson.dumps(rationales, option=orjson.OPT_INDENT_2).decode())
 
         # Use these rationales when creating the result
-        result = {
-            "personas": [
-                {
-                    "name": persona.get('name', 'Unknown'),
-                    "role": persona.get('role', 'Unknown'),
-                    "background": persona.get('background', 'No background available'),
-                    "core_expertise": persona.get('core_expertise', []),
-                    "cognitive_approach": persona.get('cognitive_approach', ''),
-                    "values_and_motivations": persona.get('values_and_motivations', ''),
-                    "communication_style": persona.get('communication_style', ''),
-                    "notable_trait": persona.get('notable_trait', ''),
-                    "rationale": rationales.get(persona['original_role'], "Error: No rationale provided")
-                }
-                for persona in selected_persona_definitions
-            ]
-        }
-
-        logger.info(f"Returning personas: {json.dumps(result, indent=2)}")
+        result = build_persona_result(selected_persona_definitions, rationales)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Returning personas: %s", orjson.dumps(result, option=orjson.OPT_INDENT_2).decode())
+        # Don't cache a degraded selection: one with randomly substituted personas or placeholder rationales
+        degraded = validated_personas != selected_personas or any(p not in rationales for p in validated_personas)
+        if not degraded and embedding is not None:
+            app.state.persona_cache.put(question.text, embedding, result)
         return result
 
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error occurred during persona selection: {str(e)}", exc_info=True)
+        logger.error("Error occurred during persona selection: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-# Improve Question
-@app.post("/improve-question")
-async def improve_question(request: dict):
+BATCH_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+def batch_record_path(batch_id):
+    """Return the file tracking a persona-selection batch, rejecting ids that aren't OpenAI batch ids."""
+    if not re.fullmatch(r"batch_[A-Za-z0-9]+", batch_id):
+        raise HTTPException(status_code=404, detail="Unknown batch")
+    return os.path.join(BATCH_RESULTS_DIR, f"{batch_id}.json")
+
+def load_batch_record(batch_id):
+    path = batch_record_path(batch_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Unknown batch")
+    with open(path, 'rb') as file:
+        return orjson.loads(file.read())
+
+def save_batch_record(batch_id, record):
+    """Write a batch record atomically, since the poller, GET requests and other workers may refresh it at once."""
+    path = batch_record_path(batch_id)
+    os.makedirs(BATCH_RESULTS_DIR, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=BATCH_RESULTS_DIR, prefix=f".{batch_id}.", suffix=".tmp")
     try:
-        logger.info(f"Improving question: {request['text']}")
-        
-        question = request['text']
-        personas = request['personas']
-        
-        # Format full persona definitions for the prompt
-        persona_info = "\n\n".join([
-            f"Name: {persona['name']}\n"
-            f"Role: {persona['role']}\n"
-            f"Background: {persona['background']}\n"
-            f"Core Expertise: {', '.join(persona['core_expertise'])}\n"
-            f"Cognitive Approach: {persona['cognitive_approach']}\n"
-            f"Values and Motivations: {persona['values_and_motivations']}\n"
-            f"Communication Style: {persona['communication_style']}\n"
-            f"Notable Trait: {persona['notable_trait']}\n"
-            f"Rationale for Selection: {persona['rationale']}"
-            for persona in personas
-        ])
-
-        # Initialize ChatOpenAI model
-        chat = ChatOpenAI(temperature=0.5,
-                          openai_api_key=openai_api_key,
-                          model='gpt-4o-mini')
+        with os.fdopen(fd, 'wb') as file:
+            file.write(orjson.dumps(record))
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+def parse_batch_output(output, questions):
+    """Turn Batch API output and error file lines into per-question persona selections, in request order."""
+    results = [{"question": question, "error": "No result returned"} for question in questions]
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        try:
+            item = orjson.loads(line)
+            index = int(item['custom_id'].removeprefix('question-'))
+            if not 0 <= index < len(questions):
+                raise ValueError(f"unknown custom_id {item['custom_id']}")
+        except Exception as e:
+            # A line that can't be matched to a question leaves that question's default error in place
+            logger.warning("Skipping unreadable batch output line: %s", e)
+            continue
+        try:
+            response = item.get('response') or {}
+            if response.get('status_code') != 200:
+                error = item.get('error') or (response.get('body') or {}).get('error') or {}
+                raise ValueError(error.get('message') or f"status code {response.get('status_code')}")
+            content = response['body']['choices'][0]['message']['content']
+            selection = PersonaSelection.model_validate_json(content)
+            validated_personas = validate_persona_selection([selection.persona1, selection.persona2, selection.persona3])
+            selected_persona_definitions = [get_persona_definition(persona) for persona in validated_personas]
+            results[index] = {"question": questions[index],
+                              **build_persona_result(selected_persona_definitions, selection.rationale)}
+        except Exception as e:
+            logger.warning("Batch item %s failed: %s", item.get('custom_id'), e)
+            results[index] = {"question": questions[index], "error": str(e)}
+    return results
+
+async def refresh_persona_batch(batch_id):
+    """Update a batch's stored record from OpenAI, downloading its results once it has completed."""
+    record = load_batch_record(batch_id)
+    if record['status'] in BATCH_TERMINAL_STATUSES:
+        return record
+
+    client = app.state.openai_client
+    job = await openai_request(client.batches.retrieve, batch_id)
+    record['status'] = job.status
+    if job.status == "completed":
+        # Failed requests are reported in a separate error file, which is the only file when all of them fail
+        files = [file_id for file_id in (job.output_file_id, job.error_file_id) if file_id]
+        contents = await asyncio.gather(*(openai_request(client.files.content, file_id) for file_id in files))
+        record['results'] = parse_batch_output("\n".join(content.text for content in contents), record['questions'])
+    save_batch_record(batch_id, record)
+    return record
+
+async def poll_persona_batch(batch_id):
+    """Poll a batch in the background until OpenAI reports a terminal status."""
+    while True:
+        try:
+            record = await refresh_persona_batch(batch_id)
+            if record['status'] in BATCH_TERMINAL_STATUSES:
+                logger.info("Persona selection batch %s finished with status %s", batch_id, record['status'])
+                return
+        except HTTPException as e:
+            # The record is gone or the id is invalid, so polling again can't succeed
+            logger.error("Stopped polling persona selection batch %s: %s", batch_id, e.detail)
+            return
+        except Exception as e:
+            logger.error("Error polling persona selection batch %s: %s", batch_id, e)
+        await asyncio.sleep(BATCH_POLL_INTERVAL_SECONDS)
+
+# Select Personas for many questions through the OpenAI Batch API (results within 24h, at half the cost)
+@app.post("/select-personas-batch")
+async def select_personas_batch(batch: QuestionBatch):
+    try:
+        logger.info("Submitting persona selection batch of %d questions", len(batch.questions))
+        reload_personas_if_changed()
+
+        requests = [
+            orjson.dumps({
+                "custom_id": f"question-{index}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": SELECTOR_MODEL,
+                    "temperature": TEMPERATURE,
+                    "response_format": {"type": "json_object"},
+                    "messages": [{"role": "user", "content": build_persona_selection_prompt(question)}],
+                },
+            })
+            for index, question in enumerate(batch.questions)
+        ]
 
-        conversation = ConversationChain(
-            llm=chat,
-            memory=ConversationBufferMemory()
+        client = app.state.openai_client
+        input_file = await openai_request(
+            client.files.create,
+            file=("persona_selection_batch.jsonl", b"\n".join(requests)),
+            purpose="batch",
         )
-
-        # Prompt 1: Brainstorm
-        prompt_1_template = PromptTemplate(
-            input_variables=["selected_personas", "question"],
-            template="""
-            You are a QuestionImprover reasoning agent using three unique, specified personas to reason collectively step by step to ultimately provide 
-            the best possible quality improvement to a given question by arriving at a synthesized improved version of the question.
-
-            To begin with, allow each persona to share their initial insights about the following question. 
-            Detail your perspective, drawing on specific knowledge, experiences, and pioneering concepts from your field.
-            Aim to uncover new angles and dimensions of the question, demonstrating how your unique expertise contributes 
-            to a multifaceted understanding. In subsequent prompts, we'll engage in a collaborative process where these 
-            perspectives are woven into an intricate network of thoughts. Later in the conversation, we'll highlight how 
-            each viewpoint complements or challenges the others, constructing a more multidimensional and higher quality question 
-            to pose back to the user who asked the initial question.
-
-            The personas are:
-            {selected_personas}
-
-            The question is: {question}
-            
-            Please output each persona's individual initial response to the question on a new line.
-            """
+        job = await openai_request(
+            client.batches.create,
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
         )
+        save_batch_record(job.id, {"status": job.status, "questions": batch.questions})
 
-        prompt_1 = prompt_1_template.format(selected_personas=persona_info, question=question)
-        first = get_content(conversation.invoke(prompt_1))
-
-        # Prompt 2: Self<>Peer Criticism
-        prompt_2 = """
-        Adopt a critical lens. Evaluate and challenge your own initial analysis and the analyses provided by your peers.
-        As each expert, critically examine the collective insights thus far, aiming not just to critique but to enrich and expand upon them. 
-        This process should delve into identifying underlying assumptions, potential biases, and areas where further exploration 
-        could yield significant insights, thereby enhancing the collective understanding.
-        """
+        # Keep a reference so the poller isn't garbage collected while it waits
+        poller = asyncio.create_task(poll_persona_batch(job.id))
+        app.state.batch_pollers.add(poller)
+        poller.add_done_callback(app.state.batch_pollers.discard)
 
-        second = get_content(conversation.invoke(prompt_2))
+        return {"batch_id": job.id, "status": job.status}
 
-        # Prompt 3: Self<>Peer Evaluation
-        prompt_3 = """
-        Reflect on the critiques received, and adapt your perspectives accordingly. 
-        This prompt is about evolution and expansion of thought, where you reassess and reformulate ideas,
-        creating a more nuanced and comprehensive network of interconnected ideas and insights in relation to the question.
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error occurred during persona selection batch submission: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
 
-        Prioritize assertions that are well-supported, constructive and resilient to scrutiny.
-        """
+@app.get("/select-personas-batch/{batch_id}")
+async def get_persona_batch(batch_id: str):
+    try:
+        return await refresh_persona_batch(batch_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error occurred while fetching persona selection batch: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
 
-        third = get_content(conversation.invoke(prompt_3))
+def improvement_cache_tag(personas):
+    """Return the cache tag for an improve-question request, since its result depends on the personas used.
 
-        # Prompt 4: Expand, Explore, Branch, Network
-        prompt_4 = """
-        In this stage, weave a network of thoughts by integrating critiques and alternative perspectives.
-        Focus on how new ideas can interconnect with and enhance existing thoughts. 
-        Explore the potential of novel concepts to form new nodes in this thought network. 
+    Display names aren't unique across personas, so each persona is identified by its name and role.
+    """
+    return "|".join(sorted(f"{persona.name}/{persona.role}" for persona in personas))
 
-        Push the boundaries of conventional thinking. Each persona explores new, divergent ideas, stimulated by the feedback loop. 
-        Critically assess how these ideas not only address previous criticisms but also contribute fresh insights, 
-        creating a richer and more intricate web of understanding, or introducing new dimensions to the question.
-        Consider pivoting to new lines of reasoning that promise to add valuable connections to this evolving thought network.
-        """
+async def cached_improvement_events(result):
+    """Replay a cached improve-question result in the same event format as a live run."""
+    for key, value in result.items():
+        yield sse_event({"key": key, "delta": value})
+    yield sse_event({"done": True, "result": result})
 
-        fourth = get_content(conversation.invoke(prompt_4))
+async def improvement_events(question, personas, embedding):
+    """Run the improve-question prompt sequence, yielding SSE events as user-visible answers are produced."""
+    try:
+        # Format full persona definitions for the prompt
+        persona_info = "\n\n".join(
+            get_persona_block(persona) + f"\nRationale for Selection: {persona.rationale}"
+            for persona in personas
+        )
 
-        # Prompt 5: Convergence on Best Individual Answer
-        prompt_5 = f"""
-        Now, it's time for each expert to finalize their thoughts and converge on a best answer. 
-        Synthesize the insights and critiques into a coherent individual conclusion.
+        # Conversation history shared by the sequential prompts
+        messages = []
 
-        Reflect on the entire dialogue, considering how each criticism was addressed and how your thoughts evolved. 
-        Your answer should not only represent your strongest position but also acknowledge and integrate valid and useful
-        insights from the other expert perspectives.
-        
-        Based on all this, as each expert, what is the single best answer to the initial question: {question}?
+        # Prompt 1: Brainstorm
+        first = await ask(messages, PROMPT_1.format(selected_personas=persona_info, question=question))
 
-        Format the output with persona's name, title, and final answer.
-        """
+        # Prompts 2-4: Self<>Peer Criticism, Self<>Peer Evaluation, and Expand/Explore/Branch/Network.
+        # Each step only builds on the previous one, so they are answered in a single response.
+        critique = await ask(messages, PROMPT_2)
+        critique_steps = [step.strip() for step in critique.split("###") if step.strip()]
+        if len(critique_steps) != 3:
+            logger.warning("Combined critique prompt returned %d steps instead of 3", len(critique_steps))
+        for step in critique_steps:
+            logger.debug("Critique step: %s", step)
 
-        fifth = get_content(conversation.invoke(prompt_5))
+        # Prompt 5: Convergence on Best Individual Answer
+        fifth = await ask(messages, PROMPT_5.format(question=question))
+        yield sse_event({"key": "individual_answers", "delta": fifth})
 
         # Prompt 6: Convergence on Best Collective Answer
-        prompt_6 = """
-        Facilitate a synthesis of the individual experts' answers to forge a unified, comprehensive response
-        that combines the best elements from each persona's insights.
-        This response should be a testament to the depth and complexity of the thought network, 
-        showcasing how diverse perspectives can coalesce into a singular, insightful narrative.
-
-        The synthesized answer should not be formulated in explicit terms specific to each persona's own definition or agenda, 
-        but rather it should be phrased in a way that seeks to inspire and uncover broad, general, deeper truths, 
-        regardless of what personas happened to be involved in this discussion. 
-        A great answer will transcend the limited view of any one expert.
-        """
-
-        sixth = get_content(conversation.invoke(prompt_6))
-
-
-
+        sixth = await ask(messages, PROMPT_6)
+        yield sse_event({"key": "final_answer", "delta": sixth})
 
         # Prompt 7: New Enhanced Question
-        prompt_7 = f"""
-        As we conclude our collaborative journey and after thorough analysis and reflection on the entire discussion,
-        let's now focus on the final objective - to vastly elevate the original question into a more insightful and universally engaging form. 
-
-        After going through the following thoughts, please take a deep breath and generate a far higher quality version of the original question.
-
-        Reformulate the initial question by weaving in the rich insights gained through this networked reasoning process. 
-
-        The new question should be deeper, clearer, and designed to catalyze more curiosity and invite more comprehensive exploration.
-
-        Here are some thoughts to consider before you propose an improved version of the question:
-
-        1. Clarify and Focus: Examine the original question's wording and structure.
-         Refine it for clarity and focus, removing any ambiguities or vague terms.
-        How can we make the question more precise and direct?
-
-        2. Deepen the Inquiry: Expand the scope of the question to incorporate the key insights and perspectives that emerged during the discussion.
-        How can the question be rephrased to encourage deeper exploration of these insights?
-        Remove any unhelpful superficialities or false dichotomies present in the original question.
-
-        3. Encourage Comprehensive Engagement: Modify the question to stimulate more comprehensive and thoughtful responses.
-        Think about how the question can invite diverse relevant viewpoints and interdisciplinary thinking.
-
-        4. Maintain Open-Endedness: Ensure that the revised question remains open-ended and thought-provoking.
-        It should encourage a range of responses, facilitating a fruitful and ongoing discussion. 
-        The improved question should not be re-formulated in terms specific to the persona's own definition or agenda, 
-        but rather it should be phrased in a way that seeks to inspire and uncover broad, general, deeper truths, 
-        regardless of what kinds people and personas explore this question in the future. 
-
-        5. Reflect on Potential for Rich Dialogue: Contemplate the key aspects of the topic that could lead to richer dialogue.
-        How can the question be framed to explore these aspects more thoroughly and inspirationally?
-
-        As a reminder, the original question was {question}
-
-        Please provide only the improved question in your response.
-        """
-
-        improved_question = get_content(conversation.invoke(prompt_7))
-        logger.info(f"Improved question: {improved_question}")
+        async for event in ask_streaming(messages, PROMPT_7.format(question=question), "improved_question"):
+            yield event
+        improved_question = messages[-1]['content']
+        logger.debug("Improved question: %s", improved_question)
+
+        # Prompts 8-11 (summary, rationale, harmony principle, new dimensions) only depend on the
+        # conversation up to the improved question, so each runs on its own copy of the history
+        # and their answers are streamed concurrently.
+        # Trim once up front, for the longest of the prompts, so the copies don't each summarize the same history.
+        tail_prompts = {
+            "summary": PROMPT_8,
+            "rationale": PROMPT_9.format(question=question, improved_question=improved_question),
+            "harmony_principle": PROMPT_10,
+            "new_dimensions": PROMPT_11.format(improved_question=improved_question),
+        }
+        await trim_history(messages, max(tail_prompts.values(), key=len))
+        tail_histories = [list(messages) for _ in tail_prompts]
+        async for event in merge_streams(*(
+            ask_streaming(history, prompt, key)
+            for history, (key, prompt) in zip(tail_histories, tail_prompts.items())
+        )):
+            yield event
+        eighth, ninth, tenth, eleventh = (history[-1]['content'] for history in tail_histories)
+        logger.debug("Conversation summary: %s", eighth)
+        logger.debug("Rationale: %s", ninth)
 
-        # Prompt 8: Summary of conversation, any major insights and turning points
-        prompt_8 = """
-        Provide a brief summary of this entire conversation so far, highlighting any major insights and/or turning points,
-        if interesting to a curious human user who wants to read the conversation's evolution and highlights in just a paragraph.
-        """
-        
-        eighth = get_content(conversation.invoke(prompt_8))
-        logger.info(f"Conversation summary: {eighth}")
-
-        # Prompt 9: Rationale for Refinement
-        prompt_9 = """
-        Generate a concise rationale for this refinement: briefly articulate why this new version is a 
-        significantly higher quality and more effective question. 
-        In contrast, include the most salient weaknesses or limitations in the way the original question was formulated.
-        """
-
-        ninth = get_content(conversation.invoke(prompt_9))
-        logger.info(f"Rationale: {ninth}")
-
-        # Harmony seeking loop
-        prompt_10 = """
-        Identify a fundamental principle that all personas can agree upon. 
-        How did this shared foundation influence the collective reasoning process?
-        """
-        tenth = get_content(conversation.invoke(prompt_10))
-
-        prompt_11 = """
-        Using a synthesized perspective, help the person who asked the initial question to explore new and related dimensions:
-        **Potential Exploration Pathways**: Offer possible directions or sub-questions for further exploration based on the enhanced question. This helps to spark more specific avenues of inquiry.
-        **Further Reading/Resources**: Include links or references to relevant literature, articles, people of interest, or studies that can provide more context or information related to the enhanced question.
-        """
-        eleventh = get_content(conversation.invoke(prompt_11))
-
-        # Return what's needed for the UI
-        return {
+        result = {
             "improved_question": improved_question,
             "final_answer": sixth,
             "summary": eighth,
@@ -447,15 +804,58 @@ async def improve_question(request: dict):
             "new_dimensions": eleventh,
             "individual_answers": fifth
         }
+        if embedding is not None:
+            app.state.improvement_cache.put(question, embedding, result, improvement_cache_tag(personas))
+
+        # Finish with everything the UI needs in one event
+        yield sse_event({"done": True, "result": result})
 
     except Exception as e:
-        logger.error(f"Error occurred: {str(e)}", exc_info=True)
+        logger.error("Error occurred: %s", e, exc_info=True)
+        # The response has already started streaming, so report the failure as an event
+        yield sse_event({"error": str(e)})
+
+async def improvement_stream(question, personas):
+    """Answer an improve-question request from the cache or by running the prompts.
+
+    The cache lookup runs inside the response stream, so its embedding call doesn't hold back the response.
+    """
+    try:
+        cached, embedding = await lookup_cached(app.state.improvement_cache, question, improvement_cache_tag(personas))
+    except Exception as e:
+        logger.error("Error occurred: %s", e, exc_info=True)
+        yield sse_event({"error": str(e)})
+        return
+    if cached is not None:
+        logger.info("Returning cached question improvement")
+        events = cached_improvement_events(cached)
+    else:
+        events = improvement_events(question, personas, embedding)
+    async for event in events:
+        yield event
+
+# Improve Question
+@app.post("/improve-question")
+async def improve_question(request: ImproveRequest):
+    try:
+        logger.info("Improving question: %s", request.text)
+        reload_personas_if_changed()
+        events = improvement_stream(request.text, request.personas)
+    except Exception as e:
+        logger.error("Error occurred: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+    return StreamingResponse(events, media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @app.get("/test")
 async def test():
     return {"message": "Test successful"}
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # One worker process per CPU, each on uvloop with the httptools parser (pip install uvloop httptools).
+    # Workers share nothing in memory: each loads personas at startup and keeps its own semantic caches
+    # and its own OPENAI_MAX_CONCURRENT cap on OpenAI calls.
+    uvicorn.run("main:app", host="0.0.0.0", port=8000,
+                workers=int(os.getenv('WEB_CONCURRENCY', os.cpu_count() or 1)),
+                loop="uvloop", http="httptools")
\ No newline at end of file
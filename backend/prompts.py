@@ -0,0 +1,119 @@
+# Prompt templates, rendered with str.format where they take arguments.
+# Later prompts are replayed with the whole conversation history, so instructions are kept terse.
+
+# Compresses the middle of an over-budget conversation history
+HISTORY_SUMMARY_PROMPT = (
+    "Summarize the discussion above as compactly as possible, keeping each persona's key positions, "
+    "critiques, and conclusions so the discussion can continue from the summary alone."
+)
+
+# Persona selection
+PERSONA_SELECTION_PROMPT = """
+Question: {question}
+
+Select the 3 personas from the list below whose combined expertise would explore this question most insightfully.
+
+Available Personas: {personas}
+
+Rules:
+1. Only select personas from the list. Do not invent new ones.
+2. Give a specific rationale for EACH selected persona.
+
+Return a JSON object with keys "persona1", "persona2", "persona3" (the three selected personas, most relevant first)
+and "rationale" (an object mapping each selected persona's name to the rationale for selecting it).
+"""
+
+# Backfill for selected personas the model gave no rationale for
+MISSING_RATIONALE_PROMPT = """
+Question: {question}
+
+Give a specific rationale for selecting each of these personas: {personas}
+
+Return a JSON object mapping each persona name to its rationale.
+"""
+
+# Prompt 1: Brainstorm
+PROMPT_1 = """
+You are a QuestionImprover agent. Three personas will reason together, step by step, to produce a higher quality version
+of a question.
+
+Personas:
+{selected_personas}
+
+Question: {question}
+
+Each persona gives their initial insights, drawing on specific knowledge and concepts from their field to surface new angles
+on the question. Output each persona's response on a new line.
+"""
+
+# Prompts 2-4: Self<>Peer Criticism, Self<>Peer Evaluation, and Expand/Explore/Branch/Network.
+# Merged into one call without a QA comparison against the three separate prompts; if answer quality
+# drops, split Step A back out and keep only Steps B and C merged.
+PROMPT_2 = """
+Do the following three steps in one response. Start each with a '###' header line (### Criticism, ### Evaluation,
+### Expansion) and do not use '###' anywhere else.
+
+Step A - Criticism: each persona challenges their own and their peers' analyses, naming underlying assumptions, biases,
+and gaps worth exploring.
+
+Step B - Evaluation: each persona revises their view in light of Step A, keeping the assertions that are well-supported
+and survive scrutiny.
+
+Step C - Expansion: integrate the critiques into 2-3 novel cross-connections between the perspectives, and have each persona
+propose one new divergent idea that adds a dimension to the question.
+"""
+
+# Prompt 5: Convergence on Best Individual Answer
+PROMPT_5 = """
+Each persona now gives their single best answer to the initial question: {question}
+
+Build on how their thinking evolved in the discussion and integrate valid insights from the other personas.
+
+Format: persona's name, title, and final answer.
+"""
+
+# Prompt 6: Convergence on Best Collective Answer
+PROMPT_6 = """
+Synthesize the individual answers into one unified answer that combines the best of each.
+Phrase it in general terms that reveal deeper truths, not in terms of any persona's field or agenda.
+"""
+
+# Prompt 7: New Enhanced Question
+PROMPT_7 = """
+Using the insights from the whole discussion, rewrite the original question into a far higher quality version. It should:
+1. Be clear and precise, without ambiguity or vague terms.
+2. Incorporate the key insights that emerged, dropping superficialities and false dichotomies.
+3. Invite thoughtful, interdisciplinary answers.
+4. Stay open-ended, phrased in general terms rather than any persona's field or agenda.
+
+Original question: {question}
+
+Reply with only the improved question.
+"""
+
+# Prompt 8: Summary of conversation, any major insights and turning points
+PROMPT_8 = """
+Summarize this conversation in one paragraph for a curious reader, highlighting its major insights and turning points.
+"""
+
+# Prompt 9: Rationale for Refinement
+PROMPT_9 = """
+Concisely explain why the improved question is more effective, and name the main weaknesses of the original's formulation.
+
+Original question: {question}
+Improved question: {improved_question}
+"""
+
+# Prompt 10: Harmony seeking loop
+PROMPT_10 = """
+Name one fundamental principle all personas agree on, and how it shaped the collective reasoning.
+"""
+
+# Prompt 11: New and related dimensions
+PROMPT_11 = """
+For the person who asked, suggest new and related dimensions of the enhanced question:
+**Potential Exploration Pathways**: directions or sub-questions for further inquiry.
+**Further Reading/Resources**: relevant literature, articles, people, or studies.
+
+Enhanced question: {improved_question}
+"""
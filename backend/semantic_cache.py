@@ -0,0 +1,92 @@
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_question(text):
+    """Lowercase a question and collapse its whitespace so trivially different spellings share a key."""
+    return " ".join(text.lower().split())
+
+
+class SemanticCache:
+    """LRU cache of responses, looked up by exact normalized question or by embedding similarity.
+
+    Embeddings are kept as unit vectors in a flat matrix, so a similarity lookup is a single
+    matrix-vector product. Entries carry a tag, and lookups only match entries with the same tag.
+    """
+
+    def __init__(self, max_entries=10_000, threshold=0.95):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._clear()
+
+    def _clear(self):
+        self._exact = {}            # (normalized question, tag) -> slot
+        self._lru = OrderedDict()   # slot -> ((normalized question, tag), payload), least recently used first
+        self._vectors = None        # one unit embedding per slot, allocated on the first insert
+        self._tags = np.zeros(0, dtype=np.int64)
+
+    def clear(self):
+        self._clear()
+
+    def __len__(self):
+        return len(self._lru)
+
+    def get_exact(self, question, tag=""):
+        """Return the payload stored for exactly this question, or None."""
+        slot = self._exact.get((normalize_question(question), tag))
+        return None if slot is None else self._touch(slot)
+
+    def get_similar(self, embedding, tag=""):
+        """Return the payload of the most similar cached question if it clears the threshold, or None."""
+        if not self._lru:
+            return None
+        size = len(self._lru)
+        scores = self._vectors[:size] @ self._unit(embedding)
+        scores[self._tags[:size] != hash(tag)] = -1.0
+        slot = int(scores.argmax())
+        if scores[slot] < self.threshold:
+            return None
+        return self._touch(slot)
+
+    def put(self, question, embedding, payload, tag=""):
+        """Store a payload, evicting the least recently used entry once the cache is full."""
+        key = (normalize_question(question), tag)
+        vector = self._unit(embedding)
+        slot = self._exact.get(key)
+        if slot is None:
+            if len(self._lru) >= self.max_entries:
+                slot, (evicted_key, _) = self._lru.popitem(last=False)
+                del self._exact[evicted_key]
+            else:
+                # Slots are only freed by eviction, so until the cache is full they are contiguous
+                slot = len(self._lru)
+                self._reserve(slot + 1, vector.size)
+        self._vectors[slot] = vector
+        self._tags[slot] = hash(tag)
+        self._exact[key] = slot
+        self._lru[slot] = (key, payload)
+        self._lru.move_to_end(slot)
+
+    def _touch(self, slot):
+        self._lru.move_to_end(slot)
+        return self._lru[slot][1]
+
+    def _reserve(self, size, dim):
+        """Grow the embedding matrix geometrically so inserts stay amortized O(1)."""
+        capacity = 0 if self._vectors is None else len(self._vectors)
+        if size <= capacity:
+            return
+        capacity = min(self.max_entries, max(size, capacity * 2, 64))
+        vectors = np.zeros((capacity, dim), dtype=np.float32)
+        tags = np.zeros(capacity, dtype=np.int64)
+        if self._vectors is not None:
+            vectors[:len(self._vectors)] = self._vectors
+            tags[:len(self._tags)] = self._tags
+        self._vectors, self._tags = vectors, tags
+
+    @staticmethod
+    def _unit(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -61,6 +61,7 @@ interface Persona {
   communication_style: string;
   notable_trait: string;
   rationale: string;
+  original_role?: string;
 }
 
 interface QuestionImproverResponse {
@@ -68,8 +69,50 @@ interface QuestionImproverResponse {
   final_answer: string;
   summary: string;
   rationale: string;
+  harmony_principle: string;
+  new_dimensions: string;
+  individual_answers: string;
 }
 
+interface ImprovementEvent {
+  key?: keyof QuestionImproverResponse;
+  delta?: string;
+  done?: boolean;
+  result?: QuestionImproverResponse;
+  error?: string;
+}
+
+// Read the Server-Sent Events stream from /improve-question, reporting partial answers as they arrive
+const readImprovementStream = async (
+  response: Response,
+  onDelta: (key: keyof QuestionImproverResponse, delta: string) => void
+): Promise<QuestionImproverResponse> => {
+  if (!response.body) {
+    throw new Error('Response body is not readable');
+  }
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const events = buffer.split('\n\n');
+    buffer = events.pop() ?? '';
+
+    for (const event of events) {
+      if (!event.startsWith('data: ')) continue;
+      const data: ImprovementEvent = JSON.parse(event.slice('data: '.length));
+      if (data.error) throw new Error(data.error);
+      if (data.done && data.result) return data.result;
+      if (data.key && data.delta) onDelta(data.key, data.delta);
+    }
+  }
+
+  throw new Error('Improvement stream ended before the result was received');
+};
+
 const reasoningStages = [
   { name: "Melodic Inception", description: "Introducing the initial theme and identifying key motifs." },
   { name: "Harmonic Perspectives", description: "Gathering diverse viewpoints to create a rich harmonic texture." },
@@ -279,8 +322,26 @@ export default function QuestionImprover() {
         if (!improvementResponse.ok) {
           throw new Error(`HTTP error! status: ${improvementResponse.status}`);
         }
-  
-        const improvementData: QuestionImproverResponse = await improvementResponse.json();
+
+        const setters: Record<keyof QuestionImproverResponse, (value: string) => void> = {
+          improved_question: setRefinedQuestion,
+          final_answer: setBestAnswer,
+          summary: setConversationJourney,
+          rationale: setRefinementRationale,
+          harmony_principle: setHarmonyPrinciple,
+          new_dimensions: setNewDimensions,
+          individual_answers: setIndividualAnswers,
+        };
+        Object.values(setters).forEach(setter => setter(''));
+
+        // Show answers while they are still being generated
+        const streamed: Partial<QuestionImproverResponse> = {};
+        const improvementData = await readImprovementStream(improvementResponse, (key, delta) => {
+          const value = (streamed[key] ?? '') + delta;
+          streamed[key] = value;
+          setters[key](value);
+          setShowInsights(true);
+        });
   
         // Set the data immediately
         setRefinedQuestion(improvementData.improved_question);